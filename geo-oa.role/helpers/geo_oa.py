@@ -2,13 +2,16 @@
 # Provides functions for measuring and interpreting osteoarthritis severity in murine knee joints
 
 import core
+import geometry
 import os
 import sys
 import types
 import json
 import random
 import string
-import math
+import struct
+import functools
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
 # ============================================================================
@@ -60,26 +63,318 @@ COLORS = {
     'landmark': (255, 255, 255)         # White
 }
 
+# Protocol measurements: (column, landmark group, start, end, overlay label, color key)
+MEASUREMENTS = [
+    ('femoral_width_mm', 'femoral', 'lateral_condyle', 'medial_condyle', 'W', 'femoral_width'),
+    ('femoral_length_mm', 'femoral', 'groove_midpoint', 'intercondylar_notch', 'L', 'femoral_length'),
+    ('tibial_width_mm', 'tibial', 'lateral_border', 'medial_border', 'W', 'tibial_width'),
+    ('iioc_height_mm', 'tibial', 'articular_surface', 'growth_plate', 'H', 'iioc_height'),
+]
+
+
+# ============================================================================
+# SCAN METADATA (header-only)
+# ============================================================================
+
+# Length units seen in ImageJ/OME descriptions and TIFF tags, in millimetres
+_UNIT_TO_MM = {
+    'nm': 1e-6, 'nanometer': 1e-6,
+    'um': 1e-3, 'µm': 1e-3, 'μm': 1e-3, 'micron': 1e-3, 'microns': 1e-3, 'micrometer': 1e-3,
+    'mm': 1.0, 'millimeter': 1.0,
+    'cm': 10.0, 'centimeter': 10.0,
+    'inch': 25.4, 'in': 25.4,
+}
+
+# TIFF ResolutionUnit tag values
+_TIFF_RESOLUTION_UNIT_MM = {2: 25.4, 3: 10.0}
+
+# Plain TIFF resolutions coarser than this are display DPI, not uCT calibration
+MAX_PLAUSIBLE_VOXEL_SIZE_MM = 0.1
+
+_DICOM_TAGS = {
+    (0x0028, 0x0030): 'pixel_spacing',
+    (0x0018, 0x1164): 'imager_pixel_spacing',
+    (0x0018, 0x0050): 'slice_thickness',
+    (0x0018, 0x0088): 'spacing_between_slices',
+    (0x0028, 0x0010): 'rows',
+    (0x0028, 0x0011): 'columns',
+    (0x0008, 0x0070): 'manufacturer',
+    (0x0008, 0x1090): 'model',
+}
+_DICOM_PIXEL_DATA = (0x7FE0, 0x0010)
+_DICOM_IMPLICIT_VR_LE = '1.2.840.10008.1.2'
+
+
+def _empty_metadata(path):
+    return {
+        'path': path,
+        'format': None,
+        'width': None,
+        'height': None,
+        'n_slices': None,
+        'pixel_size_mm': None,     # (x, y)
+        'slice_spacing_mm': None,
+        'voxel_size_mm': None,     # in-plane x spacing, what pixels_to_mm expects
+        'source': None,            # which header the spacing came from
+        'scanner': None,
+        'error': None,             # set when the header could not be read
+    }
+
+
+def _unit_to_mm(unit):
+    if not unit:
+        return None
+    # ImageJ escapes the micro sign as a literal '\\u00B5'
+    return _UNIT_TO_MM.get(unit.strip().lower().replace('\\u00b5', 'µ'))
+
+
+def _parse_imagej_description(desc):
+    """ImageJ writes 'key=value' lines; resolution tags are pixels per `unit`."""
+    fields = {}
+    for line in desc.splitlines():
+        if '=' in line:
+            key, value = line.split('=', 1)
+            fields[key.strip()] = value.strip()
+    return fields
+
+
+def _parse_ome_description(desc):
+    import xml.etree.ElementTree as ET
+    root = ET.fromstring(desc)
+    pixels = next((el for el in root.iter() if el.tag.endswith('Pixels')), None)
+    if pixels is None:
+        return None
+    result = {}
+    for axis in ('X', 'Y', 'Z'):
+        size = pixels.get(f'PhysicalSize{axis}')
+        if size is None:
+            continue
+        # OME default unit is micrometres when the unit attribute is absent
+        scale = _unit_to_mm(pixels.get(f'PhysicalSize{axis}Unit', 'µm'))
+        if scale is not None:
+            result[axis] = float(size) * scale
+    if pixels.get('SizeZ'):
+        result['SizeZ'] = int(pixels.get('SizeZ'))
+    return result
+
+
+def _read_tiff_metadata(path, meta):
+    # Image.open only parses the header/IFD; pixel data is never decoded here.
+    with Image.open(path) as img:
+        meta['format'] = img.format
+        meta['width'], meta['height'] = img.size
+        meta['n_slices'] = getattr(img, 'n_frames', 1)
+        tags = getattr(img, 'tag_v2', None)
+        if tags is None:
+            return meta
+        desc = tags.get(270) or ''
+        if isinstance(desc, bytes):
+            desc = desc.decode('utf-8', errors='ignore')
+        x_res, y_res = tags.get(282), tags.get(283)
+        meta['scanner'] = tags.get(272) or tags.get(271)
+
+    if desc.lstrip().startswith('<') and 'OME' in desc:
+        ome = _parse_ome_description(desc)
+        if ome and 'X' in ome:
+            meta['pixel_size_mm'] = (ome['X'], ome.get('Y', ome['X']))
+            meta['slice_spacing_mm'] = ome.get('Z')
+            meta['n_slices'] = ome.get('SizeZ', meta['n_slices'])
+            meta['source'] = 'ome'
+            return meta
+
+    if desc.startswith('ImageJ='):
+        fields = _parse_imagej_description(desc)
+        scale = _unit_to_mm(fields.get('unit'))
+        if scale is not None and x_res:
+            px = scale / float(x_res)
+            py = scale / float(y_res) if y_res else px
+            meta['pixel_size_mm'] = (px, py)
+            if 'spacing' in fields:
+                meta['slice_spacing_mm'] = float(fields['spacing']) * scale
+            if 'slices' in fields:
+                meta['n_slices'] = int(fields['slices'])
+            meta['source'] = 'imagej'
+            return meta
+
+    # Plain TIFF resolution tags. Inch-based values are almost always display
+    # DPI (72/96/300) written by generic tools, not scanner calibration, so only
+    # centimetre resolutions are considered - and only when they are plausible
+    # for uCT, since tools also write display DPI in cm (e.g. 28.35 px/cm).
+    unit = tags.get(296, 2)
+    if unit == 3 and x_res:
+        scale = _TIFF_RESOLUTION_UNIT_MM[unit]
+        px = scale / float(x_res)
+        py = scale / float(y_res) if y_res else px
+        if max(px, py) < MAX_PLAUSIBLE_VOXEL_SIZE_MM:
+            meta['pixel_size_mm'] = (px, py)
+            meta['source'] = 'tiff'
+    return meta
+
+
+def _read_dicom_metadata(path, meta):
+    """Walk DICOM data elements up to (but never into) PixelData."""
+    meta['format'] = 'DICOM'
+    values = {}
+    with open(path, 'rb') as f:
+        f.seek(132)  # 128-byte preamble + 'DICM'
+        implicit = False
+        while True:
+            header = f.read(4)
+            if len(header) < 4:
+                break
+            group, element = struct.unpack('<HH', header)
+            if (group, element) == _DICOM_PIXEL_DATA:
+                break
+            if group == 0xFFFE:
+                # Item / delimitation markers have no VR; step into items so
+                # nested elements are walked like top-level ones.
+                f.read(4)
+                continue
+            # Group 0002 (file meta) is always explicit VR; the dataset uses the transfer syntax.
+            if implicit and group != 0x0002:
+                vr = None
+                (length,) = struct.unpack('<I', f.read(4))
+            else:
+                vr = f.read(2).decode('ascii', errors='ignore')
+                if vr in ('OB', 'OW', 'OF', 'SQ', 'UT', 'UN', 'UC', 'UR', 'OD', 'OL', 'OV'):
+                    f.read(2)
+                    (length,) = struct.unpack('<I', f.read(4))
+                else:
+                    (length,) = struct.unpack('<H', f.read(2))
+            if length == 0xFFFFFFFF:
+                # Undefined-length sequence: step inside, items are parsed as elements
+                continue
+            tag = (group, element)
+            if tag == (0x0002, 0x0010):
+                syntax = f.read(length).decode('ascii', errors='ignore').strip('\x00 ')
+                implicit = syntax == _DICOM_IMPLICIT_VR_LE
+            elif tag in _DICOM_TAGS:
+                raw = f.read(length)
+                if tag in ((0x0028, 0x0010), (0x0028, 0x0011)):
+                    values[_DICOM_TAGS[tag]] = struct.unpack('<H', raw[:2])[0]
+                else:
+                    values[_DICOM_TAGS[tag]] = raw.decode('ascii', errors='ignore').strip('\x00 ')
+            else:
+                f.seek(length, 1)
+
+    meta['width'] = values.get('columns')
+    meta['height'] = values.get('rows')
+    meta['n_slices'] = 1
+    spacing = values.get('pixel_spacing') or values.get('imager_pixel_spacing')
+    if spacing:
+        # DICOM PixelSpacing is "row\\column" (y then x) in millimetres
+        parts = [float(v) for v in spacing.split('\\') if v]
+        row, col = (parts + parts)[:2]
+        meta['pixel_size_mm'] = (col, row)
+        meta['source'] = 'dicom'
+    slice_spacing = values.get('spacing_between_slices') or values.get('slice_thickness')
+    if slice_spacing:
+        meta['slice_spacing_mm'] = float(slice_spacing)
+    scanner = ' '.join(v for v in (values.get('manufacturer'), values.get('model')) if v)
+    meta['scanner'] = scanner or None
+    return meta
+
+
+def _is_dicom(path):
+    with open(path, 'rb') as f:
+        f.seek(128)
+        return f.read(4) == b'DICM'
+
+
+@functools.lru_cache(maxsize=4096)
+def _read_scan_metadata_cached(path, mtime_ns):
+    # mtime_ns is part of the cache key only: a rewritten file gets a new entry.
+    meta = _empty_metadata(path)
+    try:
+        if _is_dicom(path):
+            _read_dicom_metadata(path, meta)
+        else:
+            _read_tiff_metadata(path, meta)
+    except (OSError, ValueError, SyntaxError, struct.error) as e:
+        # Unreadable formats (CSV, video, truncated headers) are cached as
+        # uncalibrated; lru_cache would otherwise retry them on every call.
+        meta = _empty_metadata(path)
+        meta['error'] = str(e)
+    if meta['pixel_size_mm']:
+        meta['voxel_size_mm'] = meta['pixel_size_mm'][0]
+    return meta
+
+
+def read_scan_metadata(path):
+    """
+    Read scan dimensions and physical spacing from file headers only.
+
+    Supports ImageJ and OME-TIFF descriptions, TIFF resolution tags and DICOM
+    headers; pixel data is never decoded. Results are cached per (path, mtime),
+    so repeated calls over large file listings only stat the file.
+
+    Args:
+        path: Virtual, local or bare filename of the scan (resolved like core.load_image)
+
+    Returns:
+        dict with width, height, n_slices, pixel_size_mm (x, y), slice_spacing_mm,
+        voxel_size_mm and source ('ome', 'imagej', 'tiff', 'dicom' or None)
+    """
+    local = os.path.abspath(core._find_file(path))
+    meta = _read_scan_metadata_cached(local, os.stat(local).st_mtime_ns)
+    return dict(meta, path=path)
+
+
+def get_voxel_size_mm(path=None):
+    """
+    Voxel size for `path` (default: the active file), falling back to
+    DEFAULT_VOXEL_SIZE_MM when the header carries no calibration.
+    """
+    if path is None:
+        active = core.get_active_file()
+        # Not filtered by file type: the browser labels .dcm uploads DOCUMENT, and
+        # files without a readable header are cached with meta['error'] instead.
+        if active:
+            path = active.get('virtualPath')
+    if path:
+        try:
+            voxel = read_scan_metadata(path)['voxel_size_mm']
+            if voxel:
+                return voxel
+        except Exception as e:
+            core.log(f"Could not read scan metadata for {path}: {e}", level="warning")
+    return DEFAULT_VOXEL_SIZE_MM
+
 
 # ============================================================================
 # MEASUREMENT CALCULATIONS
 # ============================================================================
 
 def distance(point1, point2):
-    """Calculate Euclidean distance between two points (in pixels)."""
-    x1, y1 = point1
-    x2, y2 = point2
-    return math.sqrt((x2 - x1)**2 + (y2 - y1)**2)
+    """
+    Euclidean distance in pixels. Two (x, y) points give a float; (N, 2)
+    arrays give an (N,) array of paired distances.
+    """
+    d = geometry.paired_distances(point1, point2)
+    if np.ndim(point1) == 1 and np.ndim(point2) == 1:
+        return float(d[0])
+    return d
 
 
-def pixels_to_mm(pixels, voxel_size_mm=DEFAULT_VOXEL_SIZE_MM):
-    """Convert pixel distance to millimeters."""
-    return pixels * voxel_size_mm
+def pixels_to_mm(pixels, voxel_size_mm=None):
+    """
+    Convert pixel distance(s) to millimeters (voxel size defaults to the active scan's).
+    voxel_size_mm may be an (N,) array with one value per specimen (row).
+    """
+    if voxel_size_mm is None:
+        voxel_size_mm = get_voxel_size_mm()
+    if np.ndim(pixels) == 0 and np.ndim(voxel_size_mm) == 0:
+        return pixels * voxel_size_mm
+    return geometry.to_mm(pixels, voxel_size_mm)
 
 
-def mm_to_pixels(mm, voxel_size_mm=DEFAULT_VOXEL_SIZE_MM):
-    """Convert millimeters to pixels."""
-    return mm / voxel_size_mm
+def mm_to_pixels(mm, voxel_size_mm=None):
+    """Convert millimeters to pixels (voxel size defaults to the active scan's)."""
+    if voxel_size_mm is None:
+        voxel_size_mm = get_voxel_size_mm()
+    if np.ndim(mm) == 0 and np.ndim(voxel_size_mm) == 0:
+        return mm / voxel_size_mm
+    return geometry.to_pixels(mm, voxel_size_mm)
 
 
 def calculate_femoral_ratio(width_mm, length_mm):
@@ -208,6 +503,195 @@ def interpret_oa_status(femoral_ratio, tibial_ratio):
     }
 
 
+def measure_specimens(landmarks, voxel_size_mm=None, specimen_ids=None):
+    """
+    Measure the Tang/Yao indices for many specimens in one vectorized pass.
+
+    Args:
+        landmarks: dict like create_measurement_overlay's, but each landmark is an
+                   (N, 2) array with one row per specimen
+        voxel_size_mm: Scalar or (N,) per-specimen voxel sizes (default: active scan)
+        specimen_ids: Optional (N,) labels used as the DataFrame index
+
+    Returns:
+        pandas DataFrame with the *_mm measurements present, ratios and statuses
+        (same column names as generate_report / compare_groups expect); ratios
+        with a non-positive denominator are NaN with status 'INVALID'
+    """
+    import pandas as pd
+
+    if voxel_size_mm is None:
+        voxel_size_mm = get_voxel_size_mm()
+
+    columns = {}
+    for column, group, a, b, _, _ in MEASUREMENTS:
+        pts = landmarks.get(group, {})
+        if a in pts and b in pts:
+            columns[column] = pixels_to_mm(geometry.paired_distances(pts[a], pts[b]), voxel_size_mm)
+    df = pd.DataFrame(columns, index=specimen_ids)
+
+    def ratio_of(numerator, denominator):
+        # Missing or collapsed landmarks give zero/negative denominators; keep
+        # those specimens as NaN rather than letting inf reach compare_groups.
+        num, den = df[numerator].to_numpy(), df[denominator].to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = num / den
+        ratio[(den <= 0) | ~np.isfinite(ratio)] = np.nan
+        return ratio
+
+    def classify(ratio, normal, oa):
+        return np.select([~np.isfinite(ratio), normal, oa], ['INVALID', 'NORMAL', 'OA'], default='BORDERLINE')
+
+    if 'femoral_width_mm' in df and 'femoral_length_mm' in df:
+        ratio = ratio_of('femoral_width_mm', 'femoral_length_mm')
+        df['femoral_wl_ratio'] = ratio.round(3)
+        df['femoral_status'] = classify(ratio, ratio < FEMORAL_WL_NORMAL_MAX, ratio > FEMORAL_WL_OA_MIN)
+    if 'iioc_height_mm' in df and 'tibial_width_mm' in df:
+        ratio = ratio_of('iioc_height_mm', 'tibial_width_mm')
+        df['tibial_hw_ratio'] = ratio.round(3)
+        df['tibial_status'] = classify(ratio, ratio > TIBIAL_HW_NORMAL_MIN, ratio < TIBIAL_HW_OA_MAX)
+    return df
+
+
+# ============================================================================
+# SLICE SELECTION
+# ============================================================================
+
+def _load_stack(stack, downsample=1):
+    """
+    Load a slice stack as a (Z, Y, X) array, striding rows/columns by `downsample`
+    per slice so full-resolution volumes are never held in memory.
+    Accepts a 3D array, a list of images/arrays/paths, or a multi-page TIFF path.
+    """
+    from PIL import ImageSequence
+
+    def to_gray(item):
+        if isinstance(item, str):
+            with core.load_image(item) as img:
+                return to_gray(img)
+        if hasattr(item, 'convert'):
+            if item.mode in ('RGB', 'RGBA', 'P', 'LA', 'CMYK'):
+                item = item.convert('L')
+            item = np.asarray(item)
+        arr = np.asarray(item)
+        if arr.ndim == 3:
+            arr = arr.mean(axis=2)
+        return arr[::downsample, ::downsample]
+
+    if isinstance(stack, str):
+        with core.load_image(stack) as img:
+            return np.stack([to_gray(frame) for frame in ImageSequence.Iterator(img)])
+    if hasattr(stack, 'ndim') and stack.ndim == 3:
+        return np.asarray(stack)[:, ::downsample, ::downsample]
+    return np.stack([to_gray(item) for item in stack])
+
+
+def to_display_image(image, low=1, high=99.5):
+    """
+    8-bit view of an image for drawing. 16-bit/float uCT slices are windowed to
+    the [low, high] intensity percentiles instead of being clipped at 255.
+    """
+
+    if image.mode in ('L', 'RGB', 'RGBA'):
+        return image
+    if image.mode in ('P', 'LA', 'CMYK', 'YCbCr', '1'):
+        return image.convert('RGB')
+    arr = np.asarray(image, dtype=np.float64)
+    lo, hi = np.percentile(arr, [low, high])
+    if hi <= lo:
+        hi = lo + 1
+    scaled = np.clip((arr - lo) / (hi - lo), 0, 1) * 255
+    return Image.fromarray(scaled.round().astype(np.uint8), mode='L')
+
+
+def get_stack_slice(stack, index):
+    """Return slice `index` of a stack (same inputs as select_coronal_slice) as a full-resolution PIL Image."""
+
+    if isinstance(stack, str):
+        with core.load_image(stack) as img:
+            img.seek(index)
+            return img.copy()
+    if hasattr(stack, 'ndim') and stack.ndim == 3:
+        return Image.fromarray(np.asarray(stack[index]))
+    item = stack[index]
+    if isinstance(item, str):
+        return core.load_image(item)
+    return item if hasattr(item, 'convert') else Image.fromarray(np.asarray(item))
+
+
+def select_coronal_slice(stack, threshold=None, rows=None, downsample=2, smooth=3,
+                         voxel_size_mm=None):
+    """
+    Find the coronal slice with maximal condylar (bone) width across a uCT stack.
+
+    All slices are scored at once: the stack is thresholded, the left/right bone
+    edge of every row in every slice is found with vectorized argmax, and each
+    slice's score is its widest row (95th percentile, to ignore single noisy rows).
+
+    Args:
+        stack: 3D array (Z, Y, X), list of slices (PIL Images, arrays or paths),
+               or path to a multi-page TIFF
+        threshold: Bone intensity threshold (default: Otsu over the downsampled stack)
+        rows: Optional (start, stop) row range, in full-resolution pixels, to score
+              only the condylar region
+        downsample: In-plane stride used for scoring (1 = full resolution)
+        smooth: Moving-average window (slices) applied to the score curve
+        voxel_size_mm: Voxel size for mm conversion (default: read from the stack
+                       file, else the active scan)
+
+    Returns:
+        dict with 'index' (best slice), 'scores' (smoothed width per slice, px),
+        'raw_scores', 'width_px', 'width_mm', 'threshold', 'voxel_size_mm',
+        'image' (best slice as an 8-bit PIL Image for placing landmarks and
+        create_measurement_overlay) and 'raw_image' (best slice at its original
+        bit depth, for intensity sampling); both share pixel coordinates
+    """
+
+    volume = _load_stack(stack, downsample)
+    if volume.shape[0] == 0:
+        raise ValueError("Stack contains no slices")
+
+    if rows is not None:
+        start, stop = rows
+        volume = volume[:, start // downsample:-(-stop // downsample)]
+
+    if threshold is None:
+        threshold = core.otsu_threshold(volume)
+
+    mask = volume >= threshold
+    n_cols = mask.shape[2]
+    has_bone = mask.any(axis=2)
+    left = mask.argmax(axis=2)
+    right = n_cols - 1 - mask[:, :, ::-1].argmax(axis=2)
+    row_widths = np.where(has_bone, right - left + 1, 0) * downsample
+    raw_scores = np.percentile(row_widths, 95, axis=1)
+
+    scores = raw_scores
+    if smooth and smooth > 1 and len(raw_scores) >= smooth:
+        kernel = np.ones(smooth) / smooth
+        # Edge-pad so end slices are not pulled toward zero by the convolution
+        padded = np.pad(raw_scores, (smooth // 2, smooth - 1 - smooth // 2), mode='edge')
+        scores = np.convolve(padded, kernel, mode='valid')
+
+    index = int(np.argmax(scores))
+    if voxel_size_mm is None:
+        voxel_size_mm = get_voxel_size_mm(stack if isinstance(stack, str) else None)
+    width_px = float(raw_scores[index])
+    raw_image = get_stack_slice(stack, index)
+
+    return {
+        'index': index,
+        'scores': scores,
+        'raw_scores': raw_scores,
+        'width_px': width_px,
+        'width_mm': round(pixels_to_mm(width_px, voxel_size_mm), 3),
+        'threshold': threshold,
+        'voxel_size_mm': voxel_size_mm,
+        'image': to_display_image(raw_image),
+        'raw_image': raw_image,
+    }
+
+
 # ============================================================================
 # VISUALIZATION FUNCTIONS
 # ============================================================================
@@ -280,70 +764,35 @@ def draw_landmark(image, point, label=None, color=(255, 255, 255), size=6):
     return img
 
 
-def create_measurement_overlay(image, landmarks, voxel_size_mm=DEFAULT_VOXEL_SIZE_MM):
+def create_measurement_overlay(image, landmarks, voxel_size_mm=None):
     """
     Create a complete measurement overlay on a uCT image.
 
     Args:
         image: PIL Image object
         landmarks: dict with 'femoral' and 'tibial' landmark dicts
-        voxel_size_mm: Voxel size for mm conversion
+        voxel_size_mm: Voxel size for mm conversion (default: read from the active scan)
 
     Returns:
         PIL Image with measurement overlay
     """
-    img = image.copy()
+    if voxel_size_mm is None:
+        voxel_size_mm = get_voxel_size_mm()
+    img = to_display_image(image).copy()
     if img.mode != 'RGB':
         img = img.convert('RGB')
 
-    femoral = landmarks.get('femoral', {})
-    tibial = landmarks.get('tibial', {})
-
-    # Draw femoral measurements
-    if 'lateral_condyle' in femoral and 'medial_condyle' in femoral:
-        width_px = distance(femoral['lateral_condyle'], femoral['medial_condyle'])
-        width_mm = pixels_to_mm(width_px, voxel_size_mm)
-        img = draw_measurement_line(
-            img,
-            femoral['lateral_condyle'],
-            femoral['medial_condyle'],
-            f"W: {width_mm:.2f} mm",
-            COLORS['femoral_width']
-        )
-
-    if 'groove_midpoint' in femoral and 'intercondylar_notch' in femoral:
-        length_px = distance(femoral['groove_midpoint'], femoral['intercondylar_notch'])
-        length_mm = pixels_to_mm(length_px, voxel_size_mm)
-        img = draw_measurement_line(
-            img,
-            femoral['groove_midpoint'],
-            femoral['intercondylar_notch'],
-            f"L: {length_mm:.2f} mm",
-            COLORS['femoral_length']
-        )
-
-    # Draw tibial measurements
-    if 'lateral_border' in tibial and 'medial_border' in tibial:
-        width_px = distance(tibial['lateral_border'], tibial['medial_border'])
-        width_mm = pixels_to_mm(width_px, voxel_size_mm)
-        img = draw_measurement_line(
-            img,
-            tibial['lateral_border'],
-            tibial['medial_border'],
-            f"W: {width_mm:.2f} mm",
-            COLORS['tibial_width']
-        )
-
-    if 'articular_surface' in tibial and 'growth_plate' in tibial:
-        height_px = distance(tibial['articular_surface'], tibial['growth_plate'])
-        height_mm = pixels_to_mm(height_px, voxel_size_mm)
-        img = draw_measurement_line(
-            img,
-            tibial['articular_surface'],
-            tibial['growth_plate'],
-            f"H: {height_mm:.2f} mm",
-            COLORS['iioc_height']
-        )
+    # Measure every landmark pair present in one batched call
+    present = [m for m in MEASUREMENTS
+               if m[2] in landmarks.get(m[1], {}) and m[3] in landmarks.get(m[1], {})]
+    if not present:
+        return img
+    starts = [landmarks[group][a] for _, group, a, b, _, _ in present]
+    ends = [landmarks[group][b] for _, group, a, b, _, _ in present]
+    lengths_mm = pixels_to_mm(geometry.paired_distances(starts, ends), voxel_size_mm)
+
+    for (_, _, _, _, label, color_key), start, end, length_mm in zip(present, starts, ends, lengths_mm):
+        img = draw_measurement_line(img, start, end, f"{label}: {length_mm:.2f} mm", COLORS[color_key])
 
     return img
 
@@ -439,7 +888,7 @@ def export_csv(measurements, filename):
     if not filename.endswith('.csv'):
         filename += '.csv'
 
-    path = f"/.session/{filename}"
+    path = f"{core.SESSION_DIR}/{filename}"
 
     # Handle single measurement or list
     if isinstance(measurements, dict):
@@ -527,6 +976,231 @@ def create_ratio_chart(measurements, reference_data=None):
     return fig
 
 
+# ============================================================================
+# GROUP STATISTICS
+# ============================================================================
+
+# Metrics compared by default, with their report labels
+GROUP_METRICS = {
+    'femoral_wl_ratio': 'Femoral W/L Ratio',
+    'tibial_hw_ratio': 'Tibial H/W Ratio',
+}
+
+# Upper bound on elements per resampling batch (~80 MB of float64), so
+# 10,000 resamples over large cohorts never materialise in one array.
+_RESAMPLE_BATCH_ELEMENTS = 10_000_000
+
+
+def _resample_batches(n_resamples, row_len):
+    rows = max(1, _RESAMPLE_BATCH_ELEMENTS // max(row_len, 1))
+    for start in range(0, n_resamples, rows):
+        yield min(rows, n_resamples - start)
+
+
+def _hedges_g(mean_a, mean_b, var_a, var_b, n_a, n_b):
+    """
+    Bias-corrected standardized mean difference; works on scalars or arrays.
+    NaN where the pooled SD is zero (no spread in either group).
+    """
+    pooled_sd = np.sqrt(((n_a - 1) * var_a + (n_b - 1) * var_b) / (n_a + n_b - 2))
+    correction = 1 - 3 / (4 * (n_a + n_b) - 9)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        g = (mean_a - mean_b) / pooled_sd * correction
+    return np.where(pooled_sd > 0, g, np.nan)
+
+
+def _compare_two(a, b, n_boot, n_perm, ci, rng):
+    """Bootstrap CIs and a permutation p-value for mean(a) - mean(b), all batched."""
+    n_a, n_b = len(a), len(b)
+    diff = a.mean() - b.mean()
+    g = _hedges_g(a.mean(), b.mean(), a.var(ddof=1), b.var(ddof=1), n_a, n_b)
+    # Cliff's delta via one broadcasted comparison matrix
+    cliffs = float(np.sign(a[:, None] - b[None, :]).mean())
+
+    # Bootstrap: each row of the index matrices is one resample of each group
+    boot_diff = np.empty(n_boot)
+    boot_g = np.empty(n_boot)
+    done = 0
+    for rows in _resample_batches(n_boot, n_a + n_b):
+        ra = a[rng.integers(0, n_a, size=(rows, n_a))]
+        rb = b[rng.integers(0, n_b, size=(rows, n_b))]
+        ma, mb = ra.mean(axis=1), rb.mean(axis=1)
+        boot_diff[done:done + rows] = ma - mb
+        boot_g[done:done + rows] = _hedges_g(ma, mb, ra.var(axis=1, ddof=1), rb.var(axis=1, ddof=1), n_a, n_b)
+        done += rows
+
+    # Permutation test: shuffle group labels row-wise over the pooled sample
+    pooled = np.concatenate([a, b])
+    extreme = 0
+    for rows in _resample_batches(n_perm, n_a + n_b):
+        perm = rng.permuted(np.broadcast_to(pooled, (rows, n_a + n_b)), axis=1)
+        perm_diff = perm[:, :n_a].mean(axis=1) - perm[:, n_a:].mean(axis=1)
+        extreme += int(np.count_nonzero(np.abs(perm_diff) >= abs(diff) - 1e-12))
+
+    alpha = (1 - ci) / 2
+    q = [alpha * 100, (1 - alpha) * 100]
+    # Zero-variance groups have no standardized effect; resamples without
+    # spread are left out of the interval.
+    g_defined = np.isfinite(g)
+    boot_g = boot_g[np.isfinite(boot_g)]
+    return {
+        'mean_diff': float(diff),
+        'mean_diff_ci': tuple(float(v) for v in np.percentile(boot_diff, q)),
+        'hedges_g': float(g) if g_defined else None,
+        'hedges_g_ci': tuple(float(v) for v in np.percentile(boot_g, q)) if g_defined and len(boot_g) else None,
+        'cliffs_delta': cliffs,
+        'p_permutation': (extreme + 1) / (n_perm + 1),
+    }
+
+
+def group_statistics(df, group_col, metrics=None, reference=None,
+                     n_boot=10000, n_perm=10000, ci=0.95, seed=None):
+    """
+    Compare each group against a reference group for every metric.
+
+    Args:
+        df: pandas DataFrame (or list of measurement dicts) with one row per specimen
+        group_col: Column holding the group/treatment label
+        metrics: Columns to compare (default: femoral W/L and tibial H/W ratios present in df)
+        reference: Reference group label (default: first group in df order)
+        n_boot: Bootstrap resamples for confidence intervals
+        n_perm: Label permutations for the two-sided p-value
+        ci: Confidence level for the intervals
+        seed: Seed for reproducible resampling
+
+    Returns:
+        dict with 'reference', 'groups' (per-group descriptive stats) and
+        'comparisons' (one dict per metric and non-reference group)
+    """
+    import pandas as pd
+
+    if not isinstance(df, pd.DataFrame):
+        df = pd.DataFrame(df)
+    if group_col not in df.columns:
+        raise KeyError(f"Column '{group_col}' not found")
+    if metrics is None:
+        metrics = [m for m in GROUP_METRICS if m in df.columns]
+    if not metrics:
+        raise ValueError("No metrics to compare")
+
+    labels = list(pd.unique(df[group_col].dropna()))
+    if reference is None:
+        reference = labels[0] if labels else None
+    if reference not in labels:
+        raise ValueError(f"Reference group '{reference}' not found in '{group_col}'")
+
+    rng = np.random.default_rng(seed)
+    groups = []
+    comparisons = []
+    for metric in metrics:
+        values = {
+            label: pd.to_numeric(df.loc[df[group_col] == label, metric], errors='coerce').to_numpy(dtype=float)
+            for label in labels
+        }
+        # Only finite values take part; NaN/inf ratios are invalid specimens
+        values = {label: x[np.isfinite(x)] for label, x in values.items()}
+        for label in labels:
+            x = values[label]
+            groups.append({
+                'metric': metric,
+                'group': label,
+                'n': int(len(x)),
+                'mean': float(x.mean()) if len(x) else None,
+                'sd': float(x.std(ddof=1)) if len(x) > 1 else None,
+            })
+        ref = values[reference]
+        for label in labels:
+            if label == reference:
+                continue
+            result = {'metric': metric, 'group': label, 'reference': reference,
+                      'n': int(len(values[label])), 'n_reference': int(len(ref))}
+            if len(values[label]) < 2 or len(ref) < 2:
+                result['error'] = 'Need at least 2 specimens per group'
+            else:
+                result.update(_compare_two(values[label], ref, n_boot, n_perm, ci, rng))
+            comparisons.append(result)
+
+    return {
+        'group_col': group_col,
+        'reference': reference,
+        'ci': ci,
+        'n_boot': n_boot,
+        'n_perm': n_perm,
+        'groups': groups,
+        'comparisons': comparisons,
+    }
+
+
+def compare_groups(df, group_col, metrics=None, reference=None,
+                   n_boot=10000, n_perm=10000, ci=0.95, seed=None):
+    """
+    Compare OA indices between treatment groups and return report blocks.
+
+    Effect sizes (mean difference, Hedges' g, Cliff's delta), bootstrap
+    confidence intervals and permutation p-values are computed for every
+    group against the reference; see group_statistics for the arguments.
+
+    Returns:
+        List of report blocks suitable for report_layer_data(), in the same
+        format as generate_report()
+    """
+    stats = group_statistics(df, group_col, metrics, reference, n_boot, n_perm, ci, seed)
+    ci_pct = f"{stats['ci'] * 100:g}%"
+
+    blocks = [{
+        'type': 'text',
+        'content': f"## Group Comparison\n### {group_col} (reference: {stats['reference']})"
+    }]
+
+    for metric in dict.fromkeys(g['metric'] for g in stats['groups']):
+        label = GROUP_METRICS.get(metric, metric)
+        blocks.append({
+            'type': 'key_value',
+            'title': f'{label}: Groups',
+            'data': {
+                str(g['group']): (f"{g['mean']:.3f} ± {g['sd']:.3f} (n={g['n']})" if g['sd'] is not None
+                                  else f"{g['mean']:.3f} (n={g['n']})" if g['mean'] is not None else 'N/A')
+                for g in stats['groups'] if g['metric'] == metric
+            }
+        })
+        for c in stats['comparisons']:
+            if c['metric'] != metric:
+                continue
+            if 'error' in c:
+                data = {'Status': c['error']}
+            else:
+                lo, hi = c['mean_diff_ci']
+                if c['hedges_g'] is None:
+                    hedges = 'N/A (no variance in either group)'
+                elif c['hedges_g_ci'] is None:
+                    hedges = f"{c['hedges_g']:+.2f}"
+                else:
+                    g_lo, g_hi = c['hedges_g_ci']
+                    hedges = f"{c['hedges_g']:+.2f} [{g_lo:+.2f}, {g_hi:+.2f}]"
+                data = {
+                    f'Mean Difference ({ci_pct} CI)': f"{c['mean_diff']:+.3f} [{lo:+.3f}, {hi:+.3f}]",
+                    f"Hedges' g ({ci_pct} CI)": hedges,
+                    "Cliff's Delta": f"{c['cliffs_delta']:+.2f}",
+                    'Permutation p': f"{c['p_permutation']:.4f}",
+                }
+            blocks.append({
+                'type': 'key_value',
+                'title': f"{label}: {c['group']} vs {c['reference']}",
+                'data': data
+            })
+
+    blocks.append({
+        'type': 'text',
+        'content': f'''
+### Methods
+- **CIs**: percentile bootstrap, {stats['n_boot']} resamples per group
+- **p-values**: two-sided permutation test on the mean difference, {stats['n_perm']} permutations
+'''
+    })
+
+    return blocks
+
+
 # ============================================================================
 # BASE MLENS FUNCTIONALITY (inherited)
 # ============================================================================
@@ -538,24 +1212,10 @@ class GeoOA:
         return core.list_files()
 
     def load_image(self, filename):
-        if os.path.exists(filename):
-            return Image.open(filename)
-        paths = [os.path.join('/.session', filename), os.path.join('/workspace/data', filename)]
-        for p in paths:
-            if os.path.exists(p):
-                return Image.open(p)
-        for root, dirs, files in os.walk('/workspace/data'):
-            if filename in files:
-                return Image.open(os.path.join(root, filename))
-        raise FileNotFoundError(f"Could not find {filename}")
+        return core.load_image(filename)
 
     def get_active_image(self):
-        active = core.get_active_file()
-        if not active:
-            raise Exception("No active file selected.")
-        if active.get('virtualPath'):
-            return self.load_image(active['virtualPath'])
-        raise FileNotFoundError("Active file not found.")
+        return core.get_active_image()
 
     def add_layer(self, name, layer_type, data, target_file=None, **style):
         if not layer_type:
@@ -579,7 +1239,7 @@ class GeoOA:
                 rand_str = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
                 safe_name = "".join([c for c in name if c.isalnum() or c in (' ', '-', '_')]).strip().replace(' ', '_')
                 fname = f"layer_{safe_name}_{rand_str}.png"
-                vfs_path = f"/.session/{fname}"
+                vfs_path = f"{core.SESSION_DIR}/{fname}"
                 data.save(vfs_path)
                 action['source'] = vfs_path
             elif isinstance(data, str):
@@ -607,7 +1267,7 @@ class GeoOA:
         rand_str = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
         safe_name = "".join([c for c in name if c.isalnum() or c in (' ', '-', '_')]).strip().replace(' ', '_')
         fname = f"artifact_{safe_name}_{rand_str}.png"
-        vfs_path = f"/.session/{fname}"
+        vfs_path = f"{core.SESSION_DIR}/{fname}"
         try:
             if hasattr(data, 'savefig'):
                 data.savefig(vfs_path)
@@ -652,7 +1312,7 @@ class GeoOA:
     def draw_measurement_line(self, image, point1, point2, label=None, color=(255, 255, 0), line_width=2):
         return draw_measurement_line(image, point1, point2, label, color, line_width)
 
-    def create_measurement_overlay(self, image, landmarks, voxel_size_mm=DEFAULT_VOXEL_SIZE_MM):
+    def create_measurement_overlay(self, image, landmarks, voxel_size_mm=None):
         return create_measurement_overlay(image, landmarks, voxel_size_mm)
 
     def generate_report(self, measurements):
@@ -664,15 +1324,42 @@ class GeoOA:
     def create_ratio_chart(self, measurements, reference_data=None):
         return create_ratio_chart(measurements, reference_data)
 
+    def measure_specimens(self, landmarks, voxel_size_mm=None, specimen_ids=None):
+        return measure_specimens(landmarks, voxel_size_mm, specimen_ids)
+
+    def select_coronal_slice(self, stack, threshold=None, rows=None, downsample=2, smooth=3,
+                             voxel_size_mm=None):
+        return select_coronal_slice(stack, threshold, rows, downsample, smooth, voxel_size_mm)
+
+    def get_stack_slice(self, stack, index):
+        return get_stack_slice(stack, index)
+
+    def to_display_image(self, image, low=1, high=99.5):
+        return to_display_image(image, low, high)
+
+    def group_statistics(self, df, group_col, metrics=None, reference=None,
+                         n_boot=10000, n_perm=10000, ci=0.95, seed=None):
+        return group_statistics(df, group_col, metrics, reference, n_boot, n_perm, ci, seed)
+
+    def compare_groups(self, df, group_col, metrics=None, reference=None,
+                       n_boot=10000, n_perm=10000, ci=0.95, seed=None):
+        return compare_groups(df, group_col, metrics, reference, n_boot, n_perm, ci, seed)
+
     def distance(self, point1, point2):
         return distance(point1, point2)
 
-    def pixels_to_mm(self, pixels, voxel_size_mm=DEFAULT_VOXEL_SIZE_MM):
+    def pixels_to_mm(self, pixels, voxel_size_mm=None):
         return pixels_to_mm(pixels, voxel_size_mm)
 
-    def mm_to_pixels(self, mm, voxel_size_mm=DEFAULT_VOXEL_SIZE_MM):
+    def mm_to_pixels(self, mm, voxel_size_mm=None):
         return mm_to_pixels(mm, voxel_size_mm)
 
+    def read_scan_metadata(self, path):
+        return read_scan_metadata(path)
+
+    def get_voxel_size_mm(self, path=None):
+        return get_voxel_size_mm(path)
+
 
 # ============================================================================
 # MODULE INITIALIZATION
@@ -694,5 +1381,7 @@ geo_oa.TIBIAL_HW_OA_MAX = TIBIAL_HW_OA_MAX
 geo_oa.DEFAULT_VOXEL_SIZE_MM = DEFAULT_VOXEL_SIZE_MM
 geo_oa.REFERENCE_RANGES = REFERENCE_RANGES
 geo_oa.COLORS = COLORS
+geo_oa.GROUP_METRICS = GROUP_METRICS
+geo_oa.MEASUREMENTS = MEASUREMENTS
 
 sys.modules["geo_oa"] = geo_oa
@@ -0,0 +1,164 @@
+# geometry.py - Batched landmark geometry for uCT measurements
+# All functions take (N, 2) arrays of (x, y) pixel coordinates (a single (x, y)
+# point broadcasts against N), so a whole cohort is measured in one call.
+
+import numpy as np
+
+
+def as_points(points):
+    """Coerce (x, y), a list of points or an array to a float (N, 2) array."""
+    arr = np.asarray(points, dtype=np.float64)
+    if arr.ndim == 1:
+        arr = arr.reshape(1, -1)
+    if arr.ndim != 2 or arr.shape[1] != 2:
+        raise ValueError(f"Expected (N, 2) points, got shape {arr.shape}")
+    return arr
+
+
+# ============================================================================
+# DISTANCES
+# ============================================================================
+
+def paired_distances(a, b):
+    """Euclidean distance between a[i] and b[i] for every row; returns (N,)."""
+    diff = as_points(b) - as_points(a)
+    return np.hypot(diff[:, 0], diff[:, 1])
+
+
+def pairwise_distances(a, b=None):
+    """Distance matrix between every point in a and every point in b (default: a); returns (N, M)."""
+    a = as_points(a)
+    b = a if b is None else as_points(b)
+    diff = a[:, None, :] - b[None, :, :]
+    return np.hypot(diff[..., 0], diff[..., 1])
+
+
+def project_onto_lines(points, line_start, line_end):
+    """
+    Foot of the perpendicular from each point onto the line through
+    line_start -> line_end (one line per row, or a single shared line).
+
+    Returns:
+        (N, 2) projected points
+    """
+    p, s, e = as_points(points), as_points(line_start), as_points(line_end)
+    d = e - s
+    length_sq = np.einsum('ij,ij->i', d, d)
+    if np.any(length_sq == 0):
+        raise ValueError("Line start and end must differ")
+    t = np.einsum('ij,ij->i', p - s, d) / length_sq
+    return s + t[:, None] * d
+
+
+def point_line_distances(points, line_start, line_end, signed=False):
+    """
+    Perpendicular distance from each point to the line through line_start -> line_end,
+    e.g. IIOC height from the articular surface to the growth-plate line.
+
+    Args:
+        points: (N, 2) points
+        line_start, line_end: (N, 2) or single (x, y) points defining the line(s)
+        signed: Keep the sign (positive = right of the start -> end direction as
+                displayed, with image y pointing down)
+
+    Returns:
+        (N,) distances in pixels
+    """
+    p, s, e = as_points(points), as_points(line_start), as_points(line_end)
+    d = e - s
+    length = np.hypot(d[:, 0], d[:, 1])
+    if np.any(length == 0):
+        raise ValueError("Line start and end must differ")
+    rel = p - s
+    cross = d[:, 0] * rel[:, 1] - d[:, 1] * rel[:, 0]
+    dist = cross / length
+    return dist if signed else np.abs(dist)
+
+
+# ============================================================================
+# ANGLES
+# ============================================================================
+
+def angles(vertex, a, b, degrees=True):
+    """Angle a-vertex-b at each vertex (0-180); returns (N,)."""
+    v, pa, pb = as_points(vertex), as_points(a), as_points(b)
+    u, w = pa - v, pb - v
+    cross = u[:, 0] * w[:, 1] - u[:, 1] * w[:, 0]
+    dot = np.einsum('ij,ij->i', u, w)
+    theta = np.abs(np.arctan2(cross, dot))
+    return np.degrees(theta) if degrees else theta
+
+
+def segment_orientations(start, end, degrees=True):
+    """Orientation of each start -> end segment relative to the image x-axis (-180, 180]; returns (N,)."""
+    d = as_points(end) - as_points(start)
+    theta = np.arctan2(d[:, 1], d[:, 0])
+    return np.degrees(theta) if degrees else theta
+
+
+# ============================================================================
+# INTENSITY PROFILES
+# ============================================================================
+
+def line_profiles(image, starts, ends, n_samples=None):
+    """
+    Sample intensities along many line segments at once (bilinear interpolation).
+
+    Args:
+        image: 2D array or PIL Image (converted to grayscale)
+        starts, ends: (N, 2) segment endpoints in pixel coordinates
+        n_samples: Samples per profile (default: longest segment length + 1)
+
+    Returns:
+        (N, n_samples) float array; samples outside the image are NaN
+    """
+    if hasattr(image, 'convert'):
+        image = image.convert('L') if image.mode not in ('L', 'I', 'I;16', 'F') else image
+    img = np.asarray(image, dtype=np.float64)
+    if img.ndim != 2:
+        raise ValueError("line_profiles expects a single-channel image")
+
+    s, e = as_points(starts), as_points(ends)
+    s, e = np.broadcast_arrays(s, e)
+    if n_samples is None:
+        n_samples = int(np.ceil(paired_distances(s, e).max())) + 1
+    t = np.linspace(0.0, 1.0, max(int(n_samples), 2))
+    xs = s[:, 0, None] + (e[:, 0] - s[:, 0])[:, None] * t
+    ys = s[:, 1, None] + (e[:, 1] - s[:, 1])[:, None] * t
+
+    h, w = img.shape
+    inside = (xs >= 0) & (xs <= w - 1) & (ys >= 0) & (ys <= h - 1)
+    x0 = np.clip(np.floor(xs).astype(np.intp), 0, max(w - 2, 0))
+    y0 = np.clip(np.floor(ys).astype(np.intp), 0, max(h - 2, 0))
+    x1 = np.minimum(x0 + 1, w - 1)
+    y1 = np.minimum(y0 + 1, h - 1)
+    fx, fy = xs - x0, ys - y0
+    top = img[y0, x0] * (1 - fx) + img[y0, x1] * fx
+    bottom = img[y1, x0] * (1 - fx) + img[y1, x1] * fx
+    profiles = top * (1 - fy) + bottom * fy
+    profiles[~inside] = np.nan
+    return profiles
+
+
+# ============================================================================
+# UNIT CONVERSION
+# ============================================================================
+
+def _per_specimen(voxel_size_mm, values):
+    """Reshape an (N,) voxel-size array so it broadcasts over the leading axis of values."""
+    voxel = np.asarray(voxel_size_mm, dtype=np.float64)
+    if voxel.ndim == 1 and values.ndim > 1:
+        voxel = voxel.reshape(-1, *([1] * (values.ndim - 1)))
+    return voxel
+
+
+def to_mm(pixels, voxel_size_mm):
+    """Pixel lengths -> mm; voxel_size_mm may be a scalar or one value per specimen (row)."""
+    values = np.asarray(pixels, dtype=np.float64)
+    return values * _per_specimen(voxel_size_mm, values)
+
+
+def to_pixels(mm, voxel_size_mm):
+    """mm -> pixel lengths; voxel_size_mm may be a scalar or one value per specimen (row)."""
+    values = np.asarray(mm, dtype=np.float64)
+    return values / _per_specimen(voxel_size_mm, values)
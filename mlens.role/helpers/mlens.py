@@ -14,19 +14,10 @@ class MorphoLens:
         return core.list_files()
 
     def load_image(self, filename):
-        if os.path.exists(filename): return Image.open(filename)
-        paths = [os.path.join('/.session', filename), os.path.join('/workspace/data', filename)]
-        for p in paths:
-            if os.path.exists(p): return Image.open(p)
-        for root, dirs, files in os.walk('/workspace/data'):
-            if filename in files: return Image.open(os.path.join(root, filename))
-        raise FileNotFoundError(f"Could not find {filename}")
+        return core.load_image(filename)
 
     def get_active_image(self):
-        active = core.get_active_file()
-        if not active: raise Exception("No active file selected.")
-        if active.get('virtualPath'): return self.load_image(active['virtualPath'])
-        raise FileNotFoundError("Active file not found.")
+        return core.get_active_image()
 
     def add_layer(self, name, layer_type, data, target_file=None, **style):
         if not layer_type:
@@ -47,7 +38,7 @@ class MorphoLens:
                 rand_str = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
                 safe_name = "".join([c for c in name if c.isalnum() or c in (' ','-','_')]).strip().replace(' ', '_')
                 fname = f"layer_{safe_name}_{rand_str}.png"
-                vfs_path = f"/.session/{fname}"
+                vfs_path = f"{core.SESSION_DIR}/{fname}"
                 data.save(vfs_path)
                 action['source'] = vfs_path
             elif isinstance(data, str): action['source'] = data
@@ -72,7 +63,7 @@ class MorphoLens:
         rand_str = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
         safe_name = "".join([c for c in name if c.isalnum() or c in (' ','-','_')]).strip().replace(' ', '_')
         fname = f"artifact_{safe_name}_{rand_str}.png"
-        vfs_path = f"/.session/{fname}"
+        vfs_path = f"{core.SESSION_DIR}/{fname}"
         try:
             if hasattr(data, 'savefig'): data.savefig(vfs_path)
             elif hasattr(data, 'save'): data.save(vfs_path)
@@ -160,6 +160,8 @@ The \`core\` module is available for system operations:
 - \`core.add_plot(name, data)\`: Attach plots to the chat.
 - \`core.load_image(path)\`: Load image from workspace.
 - \`core.get_active_image()\`: Get the currently viewed image.
+- \`core.get_grayscale(path=None)\`, \`core.get_histogram(path=None, bins=256)\`, \`core.get_otsu_threshold(path=None)\`, \`core.get_bone_mask(path=None, threshold=None)\`, \`core.get_connected_components(path=None, threshold=None)\`: Cached preprocessing of the active (or given) image. Results persist across turns until the file changes; arrays are read-only, so \`.copy()\` before modifying.
+- \`core.analyze_video(path, fn, stride=1, start_s=None, end_s=None, skip_similar=None, csv_path=None)\`: Run \`fn(rgb_frame) -> dict\` on each video frame, decoding one frame at a time; returns a DataFrame of per-frame metrics (optionally streamed to CSV). Use \`core.iter_frames(...)\` for a custom loop. Never collect all frames in a list.
 
 When you generate images or data, always save them to disk and use \`core.register_artifact\` (or role-specific helpers) to display them.
 
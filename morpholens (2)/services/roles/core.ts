@@ -1,5 +1,10 @@
 
-export const CORE_MODULE_SOURCE = `
+// Backend-independent sections (file lookup, derived-product cache, video frame
+// pipeline) live in a real .py file so the native CPython backend
+// (native/core.py) runs the same code.
+import CORE_SHARED_SOURCE from './core_shared.py?raw';
+
+const CORE_BASE_SOURCE = `
 # core.py - Base primitives for all roles
 import js
 from pyodide.ffi import to_js
@@ -21,6 +26,15 @@ try:
 except ImportError:
     pass
 
+# Virtual filesystem roots. The native backend (native/core.py) maps these onto
+# local directories, so helpers should build paths from them, not literals.
+WORKSPACE_DIR = '/workspace/data'
+SESSION_DIR = '/.session'
+
+def resolve_path(path):
+    """Map a virtual path to a readable path (identity inside Pyodide)."""
+    return path
+
 _core_state = {
     "context": {},
     "artifacts": [],
@@ -69,7 +83,7 @@ def read_file(path, binary=False):
     with open(path, mode) as f:
         return f.read()
 
-def list_files(directory="/.session"):
+def list_files(directory=SESSION_DIR):
     if not os.path.exists(directory):
         return []
     return os.listdir(directory)
@@ -95,13 +109,7 @@ def set_status(message):
 
 def load_image(filename):
     from PIL import Image
-    if os.path.exists(filename): return Image.open(filename)
-    paths = [os.path.join('/.session', filename), os.path.join('/workspace/data', filename)]
-    for p in paths:
-        if os.path.exists(p): return Image.open(p)
-    for root, dirs, files in os.walk('/workspace/data'):
-        if filename in files: return Image.open(os.path.join(root, filename))
-    raise FileNotFoundError(f"Could not find {filename}")
+    return Image.open(_find_file(filename))
 
 def get_active_image():
     active = get_active_file()
@@ -133,7 +141,7 @@ def add_layer(name, layer_type, data, target_file=None, **style):
             rand_str = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
             safe_name = "".join([c for c in name if c.isalnum() or c in (' ','-','_')]).strip().replace(' ', '_')
             fname = f"layer_{safe_name}_{rand_str}.png"
-            vfs_path = f"/.session/{fname}"
+            vfs_path = f"{SESSION_DIR}/{fname}"
             data.save(vfs_path)
             action['source'] = vfs_path
         elif isinstance(data, str): action['source'] = data
@@ -153,7 +161,7 @@ def add_plot(name, data, target_file=None):
     rand_str = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
     safe_name = "".join([c for c in name if c.isalnum() or c in (' ','-','_')]).strip().replace(' ', '_')
     fname = f"artifact_{safe_name}_{rand_str}.png"
-    vfs_path = f"/.session/{fname}"
+    vfs_path = f"{SESSION_DIR}/{fname}"
     try:
         if hasattr(data, 'savefig'): data.savefig(vfs_path)
         elif hasattr(data, 'save'): data.save(vfs_path)
@@ -179,8 +187,8 @@ def update_layer_data(layer_name, blocks, target_file=None):
     return f"Updated data blocks for layer '{layer_name}'."
 
 def save_to_project(filename, folder=None):
-    src = os.path.join('/.session', filename)
-    dest_dir = '/workspace/data'
+    src = os.path.join(SESSION_DIR, filename)
+    dest_dir = WORKSPACE_DIR
     if folder:
         dest_dir = os.path.join(dest_dir, folder)
         if not os.path.exists(dest_dir): os.makedirs(dest_dir)
@@ -252,8 +260,11 @@ def _get_actions():
 def _clear_session():
     _core_state["artifacts"] = []
     _core_actions.clear()
+    clear_derived_cache()
 `;
 
+export const CORE_MODULE_SOURCE = `${CORE_BASE_SOURCE}\n${CORE_SHARED_SOURCE}`;
+
 export function getCoreModuleSource(): string {
   return CORE_MODULE_SOURCE;
 }
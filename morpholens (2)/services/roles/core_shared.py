@@ -0,0 +1,283 @@
+# core_shared.py - Backend-independent part of the role `core` module
+#
+# Loaded by both backends: imported as raw text and appended to the Pyodide
+# core source (core.ts), and exec'd into native/core.py. It relies on names
+# every backend defines: resolve_path, SESSION_DIR, WORKSPACE_DIR,
+# get_active_file, set_status and register_artifact.
+
+import os
+import sys
+from collections import OrderedDict
+
+
+def _find_file(filename):
+    """Locate filename as a virtual/local path, then in the session, then anywhere in the workspace."""
+    local = resolve_path(filename)
+    if os.path.exists(local): return local
+    for p in (os.path.join(SESSION_DIR, filename), os.path.join(WORKSPACE_DIR, filename)):
+        if os.path.exists(p): return p
+    for root, dirs, files in os.walk(WORKSPACE_DIR):
+        if filename in files: return os.path.join(root, filename)
+    raise FileNotFoundError(f"Could not find {filename}")
+
+
+# --- Derived Product Cache ---
+# Agent turns re-run the same preprocessing on the active image. Results are
+# cached per (file, mtime, operation, params) so follow-up questions reuse them.
+# Cached arrays are returned read-only: callers must .copy() before mutating.
+
+DERIVED_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+_derived_cache = OrderedDict()  # key -> (value, nbytes), oldest first
+_derived_cache_stats = {"bytes": 0, "hits": 0, "misses": 0, "evictions": 0}
+
+def _derived_nbytes(value):
+    if hasattr(value, 'nbytes'): return int(value.nbytes)
+    if isinstance(value, (tuple, list)): return sum(_derived_nbytes(v) for v in value)
+    if isinstance(value, dict): return sum(_derived_nbytes(v) for v in value.values())
+    return sys.getsizeof(value)
+
+def _freeze(value):
+    if hasattr(value, 'setflags'): value.setflags(write=False)
+    elif isinstance(value, (tuple, list)):
+        for v in value: _freeze(v)
+    return value
+
+def _derived_source(path):
+    """(local path, mtime) of path, or of the active file when path is None."""
+    if path is None:
+        active = get_active_file()
+        if not active or not active.get('virtualPath'): raise Exception("No active file selected.")
+        path = active['virtualPath']
+    local = os.path.abspath(_find_file(path))
+    return local, os.stat(local).st_mtime_ns
+
+def cached_derived(path, operation, compute, **params):
+    """
+    Return compute() for (path, operation, params), reusing a cached result while
+    the file's mtime is unchanged. path=None means the active file.
+    """
+    local, mtime = _derived_source(path)
+    key = (local, mtime, operation, tuple(sorted(params.items())))
+    if key in _derived_cache:
+        _derived_cache.move_to_end(key)
+        _derived_cache_stats["hits"] += 1
+        return _derived_cache[key][0]
+
+    _derived_cache_stats["misses"] += 1
+    value = _freeze(compute())
+    nbytes = _derived_nbytes(value)
+    if nbytes > DERIVED_CACHE_MAX_BYTES: return value
+
+    _derived_cache[key] = (value, nbytes)
+    _derived_cache_stats["bytes"] += nbytes
+    while _derived_cache_stats["bytes"] > DERIVED_CACHE_MAX_BYTES:
+        _, (_, evicted) = _derived_cache.popitem(last=False)
+        _derived_cache_stats["bytes"] -= evicted
+        _derived_cache_stats["evictions"] += 1
+    return value
+
+def set_derived_cache_budget(max_bytes):
+    global DERIVED_CACHE_MAX_BYTES
+    DERIVED_CACHE_MAX_BYTES = int(max_bytes)
+    while _derived_cache and _derived_cache_stats["bytes"] > DERIVED_CACHE_MAX_BYTES:
+        _, (_, evicted) = _derived_cache.popitem(last=False)
+        _derived_cache_stats["bytes"] -= evicted
+        _derived_cache_stats["evictions"] += 1
+
+def clear_derived_cache():
+    _derived_cache.clear()
+    _derived_cache_stats["bytes"] = 0
+
+def derived_cache_info():
+    return dict(_derived_cache_stats, entries=len(_derived_cache), max_bytes=DERIVED_CACHE_MAX_BYTES)
+
+def get_grayscale(path=None):
+    """Grayscale pixels as a read-only NumPy array (16-bit scans keep their depth)."""
+    import numpy as np
+    from PIL import Image
+    # Decode the exact file the cache key was built from
+    local, _ = _derived_source(path)
+    def compute():
+        img = Image.open(local)
+        if img.mode in ('RGB', 'RGBA', 'P', 'LA', 'CMYK', 'YCbCr', '1'): img = img.convert('L')
+        return np.asarray(img)
+    return cached_derived(path, "grayscale", compute)
+
+def get_histogram(path=None, bins=256):
+    """(counts, bin_edges) of the grayscale image."""
+    import numpy as np
+    def compute():
+        gray = get_grayscale(path)
+        return np.histogram(gray, bins=bins, range=(float(gray.min()), float(gray.max()) + 1))
+    return cached_derived(path, "histogram", compute, bins=bins)
+
+def _otsu_from_histogram(counts, edges):
+    """Otsu threshold from a histogram: pixels >= the returned edge are foreground."""
+    import numpy as np
+    centers = (edges[:-1] + edges[1:]) / 2
+    w0 = np.cumsum(counts).astype(np.float64)
+    w1 = w0[-1] - w0
+    m0 = np.cumsum(counts * centers)
+    mu0 = np.divide(m0, w0, out=np.zeros_like(m0, dtype=np.float64), where=w0 > 0)
+    mu1 = np.divide(m0[-1] - m0, w1, out=np.zeros_like(m0, dtype=np.float64), where=w1 > 0)
+    between = w0 * w1 * (mu0 - mu1) ** 2
+    return float(edges[int(np.argmax(between)) + 1])
+
+def otsu_threshold(values, bins=256):
+    """Otsu threshold of any array (e.g. a whole stack); pixels >= it are foreground."""
+    import numpy as np
+    values = np.asarray(values)
+    counts, edges = np.histogram(values, bins=bins, range=(float(values.min()), float(values.max()) + 1))
+    return _otsu_from_histogram(counts, edges)
+
+def get_otsu_threshold(path=None, bins=256):
+    """Otsu threshold (in grayscale intensity units) from the cached histogram."""
+    def compute():
+        return _otsu_from_histogram(*get_histogram(path, bins))
+    return cached_derived(path, "otsu", compute, bins=bins)
+
+def get_bone_mask(path=None, threshold=None):
+    """Boolean mask of pixels above threshold (default: Otsu)."""
+    def compute():
+        t = get_otsu_threshold(path) if threshold is None else threshold
+        return get_grayscale(path) >= t
+    return cached_derived(path, "bone_mask", compute, threshold=threshold)
+
+def get_connected_components(path=None, threshold=None, connectivity=2):
+    """(labels, n_components) of the bone mask; connectivity 1 = 4-conn, 2 = 8-conn."""
+    def compute():
+        from scipy import ndimage
+        structure = ndimage.generate_binary_structure(2, connectivity)
+        labels, n = ndimage.label(get_bone_mask(path, threshold), structure=structure)
+        return labels, int(n)
+    return cached_derived(path, "components", compute, threshold=threshold, connectivity=connectivity)
+
+
+# --- Video Frame Pipeline ---
+
+VIDEO_PROGRESS_INTERVAL_S = 5.0
+
+def iter_frames(virtual_path, stride=1, start_s=None, end_s=None, max_dim=None, skip_similar=None):
+    """
+    Yield (frame_index, time_s, rgb_array) one decoded frame at a time.
+
+    stride: keep every Nth frame (skipped frames are grabbed but never decoded)
+    start_s / end_s: time window in seconds
+    max_dim: downscale frames so the longest side is at most max_dim
+    skip_similar: skip frames whose mean absolute difference to the last kept
+                  frame (0-255, on a 32x32 thumbnail) is below this value
+    """
+    import cv2
+    import numpy as np
+
+    cap = cv2.VideoCapture(_find_file(virtual_path))
+    if not cap.isOpened():
+        raise Exception("Could not open video file.")
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    first = int(round(start_s * fps)) if start_s and fps else 0
+    if first:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+    index = first
+    stride = max(1, int(stride))
+    last_thumb = None
+    try:
+        while True:
+            time_s = index / fps if fps else cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            if end_s is not None and time_s > end_s: break
+            if (index - first) % stride:
+                if not cap.grab(): break
+                index += 1
+                continue
+            ret, frame = cap.read()
+            if not ret: break
+
+            if skip_similar is not None:
+                thumb = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (32, 32), interpolation=cv2.INTER_AREA).astype(np.int16)
+                if last_thumb is not None and np.abs(thumb - last_thumb).mean() < skip_similar:
+                    index += 1
+                    continue
+                last_thumb = thumb
+
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            if max_dim and max(frame.shape[:2]) > max_dim:
+                scale = max_dim / max(frame.shape[:2])
+                frame = cv2.resize(frame, (int(frame.shape[1] * scale), int(frame.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+            yield index, time_s, frame
+            index += 1
+    finally:
+        # Runs even when the consumer stops iterating early
+        cap.release()
+
+def analyze_video(virtual_path, fn, stride=1, start_s=None, end_s=None, max_dim=None,
+                  skip_similar=None, csv_path=None, progress_every=0.1):
+    """
+    Run fn(rgb_array) on each frame from iter_frames and collect its metrics.
+
+    fn returns a dict of metrics (or a single value, stored as 'value'). Rows are
+    {frame, time_s, **metrics}; with csv_path they are also streamed to a CSV
+    (columns fixed by the first row) that is registered as an artifact.
+    Progress is queued as set_status actions every progress_every (fraction) of the video;
+    when the container reports no frame count, every VIDEO_PROGRESS_INTERVAL_S seconds instead.
+    Returns a pandas DataFrame (list of dicts if pandas is unavailable).
+    """
+    import csv
+    import cv2
+    import time
+
+    cap = cv2.VideoCapture(_find_file(virtual_path))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    cap.release()
+    first = int(round(start_s * fps)) if start_s and fps else 0
+    last = min(total, int(end_s * fps) + 1) if end_s is not None and fps else total
+    # Streams and some containers report 0 or -1 frames: no fraction is known
+    span = max(1, last - first) if total > 0 else None
+    name = os.path.basename(virtual_path)
+
+    rows = []
+    csv_file = None
+    writer = None
+    if csv_path:
+        if not os.path.dirname(csv_path): csv_path = f"{SESSION_DIR}/{csv_path}"
+        local_csv = resolve_path(csv_path)
+        os.makedirs(os.path.dirname(local_csv), exist_ok=True)
+        csv_file = open(local_csv, 'w', newline='')
+
+    next_report = progress_every
+    next_report_time = time.monotonic() + VIDEO_PROGRESS_INTERVAL_S
+    try:
+        for index, time_s, frame in iter_frames(virtual_path, stride, start_s, end_s, max_dim, skip_similar):
+            metrics = fn(frame)
+            if not isinstance(metrics, dict): metrics = {"value": metrics}
+            row = {"frame": index, "time_s": round(time_s, 4), **metrics}
+            rows.append(row)
+            if csv_file:
+                if writer is None:
+                    writer = csv.DictWriter(csv_file, fieldnames=list(row.keys()), extrasaction='ignore')
+                    writer.writeheader()
+                writer.writerow(row)
+
+            if not progress_every:
+                continue
+            if span:
+                done = (index - first + 1) / span
+                if done >= next_report:
+                    set_status(f"Analyzing {name}: {min(done, 1.0):.0%} ({len(rows)} frames)")
+                    while next_report <= done: next_report += progress_every
+            elif time.monotonic() >= next_report_time:
+                set_status(f"Analyzing {name}: {len(rows)} frames")
+                next_report_time = time.monotonic() + VIDEO_PROGRESS_INTERVAL_S
+    finally:
+        if csv_file: csv_file.close()
+
+    set_status(f"Analyzed {len(rows)} frames of {name}.")
+    if csv_path:
+        register_artifact(csv_path, type="file", metadata={"format": "csv", "source": virtual_path, "frames": len(rows)})
+
+    try:
+        import pandas as pd
+        return pd.DataFrame(rows)
+    except ImportError:
+        return rows
@@ -0,0 +1,175 @@
+# batch.py - Run a role script over many files on plain CPython
+#
+# Each input file becomes the active file of its own session, exactly as if the
+# user had selected it in the browser and run the script as a `python:run`
+# block. Work is spread across processes with multiprocessing.
+#
+# Usage:
+#   python native/batch.py --role geo-oa.role --script score.py \
+#       --workspace /data/scans --out /data/run-2026-10-18 --workers 16 '*.tif'
+#
+# Output layout (one directory per input file, mirroring the workspace tree):
+#   <out>/files/<rel path>/.session/...    artifacts written by the script
+#   <out>/files/<rel path>/actions.jsonl   queued actions, one JSON object per line
+#   <out>/summary.jsonl                    one status line per input file
+
+import argparse
+import ast
+import asyncio
+import glob
+import importlib.util
+import inspect
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+import traceback
+
+# The native core must shadow any other `core` on the path before helpers import it.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import core
+
+FILE_TYPES = {
+    '.png': 'IMAGE', '.jpg': 'IMAGE', '.jpeg': 'IMAGE', '.tif': 'IMAGE', '.tiff': 'IMAGE',
+    '.bmp': 'IMAGE', '.dcm': 'IMAGE',
+    '.mp4': 'VIDEO', '.avi': 'VIDEO', '.mov': 'VIDEO',
+    '.csv': 'DATASET', '.json': 'DATASET',
+}
+
+_worker = {}
+
+
+def load_role_helpers(role_dir):
+    """Import every helper listed in the role manifest, like pyodideService.loadRole."""
+    with open(os.path.join(role_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    for helper in manifest.get('helpers', []):
+        module_name = helper.replace('.py', '')
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(role_dir, 'helpers', helper))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        # Helpers replace their own sys.modules entry with a types.ModuleType facade.
+        spec.loader.exec_module(module)
+    return manifest
+
+
+def _init_worker(role_dir, script_path, workspace_dir):
+    load_role_helpers(role_dir)
+    with open(script_path) as f:
+        source = f.read()
+    _worker['code'] = compile(source, script_path, 'exec', flags=ast.PyCF_ALLOW_TOP_LEVEL_AWAIT)
+    _worker['workspace_dir'] = workspace_dir
+
+
+def _build_context(virtual_path):
+    name = os.path.basename(virtual_path)
+    active = {
+        "id": virtual_path,
+        "name": name,
+        "type": FILE_TYPES.get(os.path.splitext(name)[1].lower(), 'DOCUMENT'),
+        "category": "project",
+        "virtualPath": virtual_path,
+    }
+    return {"active_file": active, "files": [active]}
+
+
+def run_task(task):
+    """Run the script with `rel_path` (relative to the workspace) as the active file."""
+    rel_path, task_dir = task
+    started = time.perf_counter()
+    actions_file = os.path.join(task_dir, 'actions.jsonl')
+    session_dir = os.path.join(task_dir, '.session')
+    # Start from a clean session so artifacts from earlier runs never leak into this one
+    if os.path.exists(actions_file):
+        os.remove(actions_file)
+    shutil.rmtree(session_dir, ignore_errors=True)
+
+    core.configure(
+        workspace_dir=_worker['workspace_dir'],
+        session_dir=session_dir,
+        actions_file=actions_file,
+    )
+    core._clear_session()
+    virtual_path = f"{core.VIRTUAL_WORKSPACE_DIR}/{rel_path.replace(os.sep, '/')}"
+    core._set_context(_build_context(virtual_path))
+
+    status = "ok"
+    error = None
+    try:
+        namespace = {"__name__": "__main__"}
+        result = eval(_worker['code'], namespace)
+        if inspect.iscoroutine(result):
+            asyncio.run(result)
+    except (Exception, SystemExit) as e:
+        # sys.exit() in a script would otherwise kill the pool worker, losing
+        # the result and leaving imap_unordered waiting forever.
+        status = "error"
+        error = f"{type(e).__name__}: {e}"
+        core.log(traceback.format_exc(), level="error")
+
+    n_actions = core._flush_actions()
+    return {
+        "file": virtual_path,
+        "status": status,
+        "error": error,
+        "actions": n_actions,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def collect_inputs(workspace_dir, patterns):
+    rel_paths = []
+    for pattern in patterns:
+        matches = glob.glob(os.path.join(workspace_dir, pattern), recursive=True)
+        if not matches:
+            print(f"[batch] No files match '{pattern}'", file=sys.stderr)
+        for match in sorted(matches):
+            if os.path.isfile(match):
+                rel = os.path.relpath(match, workspace_dir)
+                if rel not in rel_paths:
+                    rel_paths.append(rel)
+    return rel_paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a role script over many files using every CPU core.")
+    parser.add_argument('--role', required=True, help="Path to a .role folder (manifest.json + helpers/)")
+    parser.add_argument('--script', required=True, help="Python script to run per file (same code as a python:run block)")
+    parser.add_argument('--workspace', required=True, help="Local directory mapped to /workspace/data")
+    parser.add_argument('--out', required=True, help="Output directory for per-file sessions and actions")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Worker processes (default: all cores)")
+    parser.add_argument('patterns', nargs='+', help="Glob patterns relative to the workspace (e.g. '**/*.tif')")
+    args = parser.parse_args(argv)
+
+    workspace_dir = os.path.abspath(args.workspace)
+    out_dir = os.path.abspath(args.out)
+    rel_paths = collect_inputs(workspace_dir, args.patterns)
+    if not rel_paths:
+        print("[batch] Nothing to do.", file=sys.stderr)
+        return 1
+
+    # Task directories mirror the workspace-relative path, so they are unique per input.
+    tasks = [(rel, os.path.join(out_dir, 'files', rel)) for rel in rel_paths]
+    os.makedirs(out_dir, exist_ok=True)
+
+    failures = 0
+    started = time.perf_counter()
+    with multiprocessing.Pool(
+        processes=max(1, args.workers),
+        initializer=_init_worker,
+        initargs=(os.path.abspath(args.role), os.path.abspath(args.script), workspace_dir),
+    ) as pool, open(os.path.join(out_dir, 'summary.jsonl'), 'w', encoding='utf-8') as summary:
+        for done, result in enumerate(pool.imap_unordered(run_task, tasks), start=1):
+            summary.write(json.dumps(result) + '\n')
+            if result["status"] != "ok":
+                failures += 1
+            print(f"[batch] {done}/{len(tasks)} {result['status']:5} {result['file']} ({result['seconds']}s)")
+
+    print(f"[batch] Finished {len(tasks)} files in {time.perf_counter() - started:.1f}s, {failures} failed.")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
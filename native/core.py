@@ -0,0 +1,360 @@
+# core.py - Native CPython backend for the role `core` module
+#
+# Drop-in replacement for the Pyodide `core` (services/roles/core.ts) so role
+# helpers (mlens.py, geo_oa.py) run on plain CPython. The virtual filesystem is
+# mapped onto local directories and queued actions are written to a JSONL file.
+#
+# Configuration (env vars, or core.configure(...) at runtime):
+#   MLENS_WORKSPACE_DIR  -> backs /workspace/data   (default: ./workspace/data)
+#   MLENS_SESSION_DIR    -> backs /.session         (default: ./.session)
+#   MLENS_ACTIONS_FILE   -> JSONL sink for actions  (default: none, flush manually)
+
+import atexit
+import importlib.metadata
+import importlib.util
+import json
+import os
+import re
+import sys
+import random
+import string
+import shutil
+
+try:
+    import numpy as np
+except ImportError:
+    pass
+
+try:
+    import pandas as pd
+except ImportError:
+    pass
+
+# Virtual roots as seen by the browser backend. Actions always carry these
+# paths so the UI can consume native output unchanged.
+VIRTUAL_WORKSPACE_DIR = '/workspace/data'
+VIRTUAL_SESSION_DIR = '/.session'
+
+WORKSPACE_DIR = os.path.abspath(os.environ.get('MLENS_WORKSPACE_DIR', os.path.join('workspace', 'data')))
+SESSION_DIR = os.path.abspath(os.environ.get('MLENS_SESSION_DIR', '.session'))
+ACTIONS_FILE = os.environ.get('MLENS_ACTIONS_FILE')
+
+_core_state = {
+    "context": {},
+    "artifacts": [],
+}
+
+_core_actions = []
+
+
+def configure(workspace_dir=None, session_dir=None, actions_file=None):
+    """Point the virtual roots at local directories (used by the batch runner per task)."""
+    global WORKSPACE_DIR, SESSION_DIR, ACTIONS_FILE
+    if workspace_dir is not None:
+        WORKSPACE_DIR = os.path.abspath(workspace_dir)
+    if session_dir is not None:
+        SESSION_DIR = os.path.abspath(session_dir)
+    if actions_file is not None:
+        ACTIONS_FILE = actions_file
+    os.makedirs(SESSION_DIR, exist_ok=True)
+
+
+def resolve_path(path):
+    """Map a virtual path (/.session/..., /workspace/data/...) to a local path."""
+    if not isinstance(path, str):
+        return path
+    for virtual_root, local_root in ((VIRTUAL_SESSION_DIR, SESSION_DIR), (VIRTUAL_WORKSPACE_DIR, WORKSPACE_DIR)):
+        if path == virtual_root or path.startswith(virtual_root + '/'):
+            return local_root + path[len(virtual_root):]
+    return path
+
+
+def to_virtual_path(path):
+    """Inverse of resolve_path: map a local path back to its virtual path."""
+    if not isinstance(path, str):
+        return path
+    for virtual_root, local_root in ((VIRTUAL_SESSION_DIR, SESSION_DIR), (VIRTUAL_WORKSPACE_DIR, WORKSPACE_DIR)):
+        if path == local_root or path.startswith(local_root + os.sep):
+            return virtual_root + path[len(local_root):].replace(os.sep, '/')
+    return path
+
+
+def register_artifact(path, type="file", metadata=None):
+    _core_actions.append({
+        "type": "register_artifact",
+        "path": path,
+        "artifactType": type,
+        "metadata": metadata or {}
+    })
+
+def get_artifacts():
+    return _core_state["artifacts"].copy()
+
+def get_context():
+    return _core_state["context"].copy()
+
+def get_active_file():
+    return _core_state["context"].get("active_file")
+
+def save_file(path, data, encoding=None):
+    path = resolve_path(path)
+    dirname = os.path.dirname(path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+
+    if hasattr(data, 'tobytes'):
+        with open(path, 'wb') as f:
+            f.write(data.tobytes())
+    elif hasattr(data, 'save'):
+        data.save(path)
+    elif isinstance(data, bytes):
+        with open(path, 'wb') as f:
+            f.write(data)
+    elif isinstance(data, str):
+        with open(path, 'w', encoding=encoding or 'utf-8') as f:
+            f.write(data)
+    else:
+        raise TypeError(f"Cannot save data of type {type(data)}")
+
+def read_file(path, binary=False):
+    mode = 'rb' if binary else 'r'
+    with open(resolve_path(path), mode) as f:
+        return f.read()
+
+def list_files(directory=None):
+    directory = resolve_path(directory) if directory else SESSION_DIR
+    if not os.path.exists(directory):
+        return []
+    return os.listdir(directory)
+
+# PyPI names used by manifests and prompts whose import name differs. Servers
+# usually carry a variant wheel (opencv-python-headless for opencv-python), so
+# the import name is what decides whether the package is available.
+_IMPORT_NAMES = {
+    'opencv-python': 'cv2',
+    'opencv-python-headless': 'cv2',
+    'opencv-contrib-python': 'cv2',
+    'opencv-contrib-python-headless': 'cv2',
+    'scikit-image': 'skimage',
+    'scikit-learn': 'sklearn',
+    'pillow': 'PIL',
+    'pyyaml': 'yaml',
+    'beautifulsoup4': 'bs4',
+}
+
+async def install_package(name):
+    # Runtime installs are deliberately unsupported: batch workers must be
+    # reproducible, so every dependency comes from the server environment.
+    requirement = re.split(r'[\s\[<>=!~;]', name.strip(), maxsplit=1)[0]
+    try:
+        importlib.metadata.distribution(requirement)
+        return
+    except importlib.metadata.PackageNotFoundError:
+        pass
+    normalized = re.sub(r'[-_.]+', '-', requirement).lower()
+    module = _IMPORT_NAMES.get(normalized, requirement.replace('-', '_'))
+    if importlib.util.find_spec(module) is None:
+        raise RuntimeError(f"Package '{name}' is not installed; the native backend does not install packages at runtime.")
+
+def log(message, level="info"):
+    _core_actions.append({
+        "type": "log",
+        "message": message,
+        "level": level
+    })
+
+def set_status(message):
+    _core_actions.append({
+        "type": "set_status",
+        "message": message
+    })
+
+# --- Workspace & Layer Utilities ---
+
+def load_image(filename):
+    from PIL import Image
+    return Image.open(_find_file(filename))
+
+def get_active_image():
+    active = get_active_file()
+    if not active: raise Exception("No active file selected.")
+    if active.get('virtualPath'): return load_image(active['virtualPath'])
+    raise FileNotFoundError("Active file not found.")
+
+def _session_filename(prefix, name):
+    rand_str = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
+    safe_name = "".join([c for c in name if c.isalnum() or c in (' ','-','_')]).strip().replace(' ', '_')
+    return f"{prefix}_{safe_name}_{rand_str}.png"
+
+def add_layer(name, layer_type, data, target_file=None, **style):
+    """
+    Adds a layer to a file.
+    layer_type: 'RASTER' (Image) or 'VECTOR' (List of dicts/shapes)
+    data: PIL Image (for RASTER) or List (for VECTOR)
+    """
+    if not layer_type:
+        if isinstance(data, list): layer_type = 'VECTOR'
+        elif hasattr(data, 'save'): layer_type = 'RASTER'
+        else: layer_type = 'VECTOR'
+
+    action = {
+        "type": "add_layer",
+        "target_file": target_file,
+        "name": name,
+        "layer_type": layer_type.upper(),
+        "style": style
+    }
+
+    if layer_type.upper() == 'RASTER':
+        if hasattr(data, 'save'):
+            fname = _session_filename("layer", name)
+            os.makedirs(SESSION_DIR, exist_ok=True)
+            data.save(os.path.join(SESSION_DIR, fname))
+            action['source'] = f"{VIRTUAL_SESSION_DIR}/{fname}"
+        elif isinstance(data, str): action['source'] = data
+        else: return "Error: Raster data must be Image or path."
+    elif layer_type.upper() == 'VECTOR':
+        action['source'] = data
+
+    _core_actions.append(action)
+    return f"Queueing creation of {layer_type} layer '{name}'."
+
+def add_plot(name, data, target_file=None):
+    fname = _session_filename("artifact", name)
+    os.makedirs(SESSION_DIR, exist_ok=True)
+    local_path = os.path.join(SESSION_DIR, fname)
+    try:
+        if hasattr(data, 'savefig'): data.savefig(local_path)
+        elif hasattr(data, 'save'): data.save(local_path)
+        else: return "Error: Data must be Figure or Image."
+    except Exception as e: return f"Error saving: {str(e)}"
+
+    _core_actions.append({
+        "type": "attach_artifact",
+        "target_file": target_file,
+        "name": name,
+        "artifact_type": "PLOT",
+        "source": f"{VIRTUAL_SESSION_DIR}/{fname}"
+    })
+    return f"Attached plot '{name}'."
+
+def update_layer_data(layer_name, blocks, target_file=None):
+    _core_actions.append({
+        "type": "update_layer_data",
+        "target_file": target_file,
+        "layer_name": layer_name,
+        "blocks": blocks
+    })
+    return f"Updated data blocks for layer '{layer_name}'."
+
+def save_to_project(filename, folder=None):
+    src = os.path.join(SESSION_DIR, filename)
+    dest_dir = WORKSPACE_DIR
+    if folder:
+        dest_dir = os.path.join(dest_dir, folder)
+        if not os.path.exists(dest_dir): os.makedirs(dest_dir)
+    dst = os.path.join(dest_dir, filename)
+    if os.path.exists(src):
+        shutil.copy2(src, dst)
+        return f"Saved {filename} to {to_virtual_path(dst)}."
+    raise FileNotFoundError(f"File {filename} not found.")
+
+# --- Media Utilities ---
+
+def convert_image(virtual_path, max_dim=4096):
+    from PIL import Image
+    import io
+    local = resolve_path(virtual_path)
+    if not os.path.exists(local): raise FileNotFoundError(f"File not found: {virtual_path}")
+    img = Image.open(local)
+    if img.mode not in ('RGB', 'RGBA'): img = img.convert('RGB')
+    width, height = img.size
+    if width > max_dim or height > max_dim: img.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
+    buf = io.BytesIO()
+    img.save(buf, format='PNG')
+    buf.seek(0)
+    return buf.read()
+
+def convert_video_to_gif(virtual_path, max_frames=30, max_dim=320):
+    import cv2
+    from PIL import Image
+    import io
+
+    local = resolve_path(virtual_path)
+    if not os.path.exists(local): raise FileNotFoundError(f"File not found: {virtual_path}")
+
+    cap = cv2.VideoCapture(local)
+    if not cap.isOpened():
+        raise Exception("Could not open video file.")
+
+    frames = []
+    frame_count = 0
+
+    while frame_count < max_frames:
+        ret, frame = cap.read()
+        if not ret: break
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        pil_img = Image.fromarray(rgb_frame)
+        width, height = pil_img.size
+        if width > max_dim or height > max_dim:
+            pil_img.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
+        frames.append(pil_img)
+        frame_count += 1
+
+    cap.release()
+
+    if not frames: raise Exception("No frames extracted.")
+
+    buf = io.BytesIO()
+    frames[0].save(buf, format='GIF', save_all=True, append_images=frames[1:], duration=200, loop=0, optimize=True)
+    buf.seek(0)
+    return buf.read()
+
+# Internal
+def _virtualize_action(action):
+    # Helpers append actions straight to _core_actions with whatever path they
+    # saved to, so local paths are rewritten here to match browser output.
+    out = dict(action)
+    for key in ("source", "path"):
+        if key in out:
+            out[key] = to_virtual_path(out[key])
+    return out
+
+def _set_context(context):
+    _core_state["context"] = context
+
+def _get_actions():
+    actions = [_virtualize_action(a) for a in _core_actions]
+    _core_actions.clear()
+    return actions
+
+def _flush_actions(actions_file=None):
+    """Append pending actions to the JSONL sink and return how many were written."""
+    actions_file = actions_file or ACTIONS_FILE
+    if not actions_file:
+        return 0
+    actions = _get_actions()
+    dirname = os.path.dirname(actions_file)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    with open(actions_file, 'a', encoding='utf-8') as f:
+        for action in actions:
+            f.write(json.dumps(action, default=str) + '\n')
+    return len(actions)
+
+def _clear_session():
+    _core_state["artifacts"] = []
+    _core_actions.clear()
+    clear_derived_cache()
+
+# Backend-independent sections (_find_file, derived-product cache, video frame
+# pipeline) are shared with the Pyodide core; see
+# morpholens (2)/services/roles/core_shared.py.
+_SHARED_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                              'morpholens (2)', 'services', 'roles', 'core_shared.py')
+with open(_SHARED_SOURCE, encoding='utf-8') as _f:
+    exec(compile(_f.read(), os.path.abspath(_SHARED_SOURCE), 'exec'), globals())
+
+# Standalone scripts (python my_script.py with native/ on PYTHONPATH) never
+# call _get_actions(), so flush whatever is left when the interpreter exits.
+atexit.register(_flush_actions)